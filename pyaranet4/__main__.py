@@ -1,13 +1,8 @@
 """
 Command-line script to interface with an Aranet4 CO₂ meter
 """
-import datetime
 import argparse
-import requests
-import time
-import csv
-import io
-import re
+import sys
 
 from pyaranet4 import Aranet4
 
@@ -39,7 +34,8 @@ def main():
     if not args.address:
         args.address = None
 
-    a4 = Aranet4(args.address)
+    # The CLI reads every value at most once, so caching is always safe here
+    a4 = Aranet4(args.address, use_cache=True)
     if args.url:
         post_data(a4, args.url)
         exit(0)
@@ -48,7 +44,8 @@ def main():
         # Map "thpc"-like sensor value as provided to actual sensor IDs
         sensor_map = {"t": a4.SENSOR_TEMPERATURE, "h": a4.SENSOR_HUMIDITY, "p": a4.SENSOR_PRESSURE,
                       "c": a4.SENSOR_CO2}
-        sensors = tuple([sensor_map[c] for c in re.sub(r"[^thpc]", "", args.params)])
+        # unknown characters are ignored, and each sensor is only read once
+        sensors = tuple(dict.fromkeys(sensor_map[c] for c in args.params if c in sensor_map))
         if not sensors:
             print("Must include at least one valid sensor")
             exit(1)
@@ -68,16 +65,21 @@ def basic_overview(a4):
 
     :param Aranet4 a4:  Aranet4 device object to read from
     """
+    # Fetch everything needed in one go; the properties then read from cache
+    a4.read_from_uuids((a4.UUID_DEVICE_NAME, a4.UUID_SOFTWARE_REVISION, a4.UUID_STORED_READINGS,
+                        a4.UUID_CURRENT_READING_FULL))
+    readings = a4.current_readings
+
     print("--------------------------------------")
     print("Connected: {:s} | {:s}".format(a4.device_name, a4.software_revision))
-    print("Updated {:d} s ago. Intervals: {:d} s".format(a4.since_last_update, a4.update_interval))
+    print("Updated {:d} s ago. Intervals: {:d} s".format(readings.since_last_update, readings.update_interval))
     print("{:d} total readings".format(a4.stored_readings_amount))
     print("--------------------------------------")
-    print("CO2:         {:d} ppm".format(a4.current_readings.co2))
-    print("Temperature: {:.2f} C".format(a4.current_readings.temperature))
-    print("Humidity:    {:d} %".format(a4.current_readings.humidity))
-    print("Pressure:    {:.2f} hPa".format(a4.current_readings.pressure))
-    print("Battery:     {:d} %".format(a4.current_readings.battery_level))
+    print("CO2:         {:d} ppm".format(readings.co2))
+    print("Temperature: {:.2f} C".format(readings.temperature))
+    print("Humidity:    {:d} %".format(readings.humidity))
+    print("Pressure:    {:.2f} hPa".format(readings.pressure))
+    print("Battery:     {:d} %".format(readings.battery_level))
     print("--------------------------------------")
     exit()
 
@@ -89,10 +91,16 @@ def post_data(a4, url):
     :param Aranet4 a4:  Aranet4 device object to read from
     :param str url:  URL to POST data to
     """
-    age = a4.since_last_update
+    # imported here rather than globally, since importing requests is
+    # relatively slow and most invocations do not need it
+    import requests
+    import time
+
+    # The full reading includes the time since the last update, so a single
+    # read suffices
     values = a4.current_readings
     r = requests.post(url, data={
-        'time': time.time() - age,
+        'time': time.time() - values.since_last_update,
         'co2': values.co2,
         'temperature': values.temperature,
         'pressure': values.pressure,
@@ -109,13 +117,16 @@ def collect_data(a4, args, sensors):
     :param args:  Command-line arguments
     :param tuple sensors:  Sensor IDs to include in readings
     """
+    import datetime
+    import csv
+
     # Fetch history. It will take a while to fetch anyway, so just get everything
     # and filter afterwards according to parameters.
     history = a4.get_history(sensors)
-    out_stream = io.StringIO() if not args.output_file else open(args.output, "w")
+    out_stream = open(args.output_file, "w", newline="") if args.output_file else sys.stdout
 
-    writer = csv.DictWriter(out_stream, fieldnames=("index", "timestamp", *history.sensors))
-    writer.writeheader()
+    writer = csv.writer(out_stream)
+    writer.writerow(("index", "timestamp", *history.sensors))
 
     # We're working with Unix timestamps, so convert provided range first
     range_start = datetime.datetime.strptime(args.history_start,
@@ -123,29 +134,27 @@ def collect_data(a4, args, sensors):
     range_end = datetime.datetime.strptime(args.history_end,
                                            "%Y-%m-%dT%H:%M:%SZ").timestamp() if args.history_end else None
 
-    # Go through history - we implement the --limit parameter here
-    for index in list(history.__getattribute__(history.sensors[0]).keys())[-args.limit:]:
-        # and the date range (if provided) here
-        if range_start and range_start > history.timestamps[index]:
-            continue
-
-        if range_end and range_end < history.timestamps[index]:
-            continue
-
-        # CSV row - only requested sensors are included as columns
-        writer.writerow({
-            "index": index,
-            "timestamp": datetime.datetime.fromtimestamp(history.timestamps[index]).strftime("%Y-%m-%d %H:%M:%S"),
-            **{
-                sensor: history.__getattribute__(sensor)[index] for sensor in history.sensors
-            }
-        })
-
-    # Either save the CSV to a file, or send it to the output buffer
+    # Determine which indexes to include - we implement the --limit parameter
+    # here, and the date range (if provided) in one pass over the result
+    indexes = list(history[history.sensors[0]].keys())[-args.limit:]
+    timestamps = history.timestamps
+    if range_start or range_end:
+        indexes = [index for index in indexes if
+                   (not range_start or timestamps[index] >= range_start) and
+                   (not range_end or timestamps[index] <= range_end)]
+
+    # Format timestamps up front; isoformat() is considerably faster than
+    # strftime() and yields the same YYYY-MM-DD HH:MM:SS format here
+    stamps = [datetime.datetime.fromtimestamp(timestamps[index]).isoformat(" ", "seconds") for index in indexes]
+
+    # Collect the data column by column - only requested sensors are included
+    # as columns - and then write all rows in one go
+    columns = [[history[sensor][index] for index in indexes] for sensor in history.sensors]
+    writer.writerows(zip(indexes, stamps, *columns))
+
+    # Rows are written directly to the stream, so only the file needs closing
     if args.output_file:
         out_stream.close()
-    else:
-        print(out_stream.getvalue())
 
 
 if __name__ == "__main__":
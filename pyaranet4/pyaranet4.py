@@ -4,15 +4,130 @@ Base class for a Bluetooth client for the Aranet4 CO₂ meter.
 import datetime
 import logging
 import asyncio
+import struct
 import time
 
 from bleak import BleakScanner, BleakClient
 from bleak.exc import BleakError
 from types import SimpleNamespace
 
-from pyaranet4.util import le16, write_le16
+try:
+    import uvloop
+
+    # uvloop has considerably less overhead per callback, which adds up when
+    # processing the notifications that make up the history. This is what
+    # uvloop.install() does, minus its deprecation warning on Python 3.12+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    # uvloop is not available on Windows; the stdlib event loop works fine
+    pass
+
+try:
+    import numpy
+except ImportError:
+    # without numpy, history values are normalized one by one
+    numpy = None
+
+from pyaranet4.util import le16, write_le16, AttributeDict
 from pyaranet4.exceptions import Aranet4NotFoundException, Aranet4BusyException, Aranet4UnpairedException
 
+# Available sensor identifiers, also available as attributes of `Aranet4`
+SENSOR_TEMPERATURE = 1
+SENSOR_HUMIDITY = 2
+SENSOR_PRESSURE = 3
+SENSOR_CO2 = 4
+
+
+def _normalize_temperature(value):
+    """
+    Normalize raw temperature value to degrees Celsius
+
+    :param int value:  Raw value
+    :return:  Normalized value, or `-1` if not an actual reading
+    """
+    if value == 0x4000:
+        return -1
+    if value > 0x8000:
+        return 0
+    return value / 20.0
+
+
+def _normalize_humidity(value):
+    """
+    Normalize raw humidity value to a percentage
+
+    :param int value:  Raw value
+    :return:  Normalized value, or `-1` if not an actual reading
+    """
+    return -1 if value & 0x80 else value
+
+
+def _normalize_pressure(value):
+    """
+    Normalize raw pressure value to hPa
+
+    :param int value:  Raw value
+    :return:  Normalized value, or `-1` if not an actual reading
+    """
+    return -1 if value & 0x8000 else value / 10.0
+
+
+def _normalize_co2(value):
+    """
+    Normalize raw CO₂ value to ppm
+
+    :param int value:  Raw value
+    :return:  Normalized value, or `-1` if not an actual reading
+    """
+    return -1 if value & 0x8000 else value
+
+
+def _normalize_temperature_array(values):
+    """
+    Normalize a numpy array of raw temperature values
+
+    :param numpy.ndarray values:  Raw values
+    :return numpy.ndarray:  Normalized values, see `_normalize_temperature`
+    """
+    # an object array, so the markers stay integers as with the scalar version
+    normalized = (values / 20.0).astype(object)
+    normalized[values == 0x4000] = -1
+    normalized[values > 0x8000] = 0
+    return normalized
+
+
+def _normalize_humidity_array(values):
+    """
+    Normalize a numpy array of raw humidity values
+
+    :param numpy.ndarray values:  Raw values
+    :return numpy.ndarray:  Normalized values, see `_normalize_humidity`
+    """
+    return numpy.where(values & 0x80, -1, values)
+
+
+def _normalize_pressure_array(values):
+    """
+    Normalize a numpy array of raw pressure values
+
+    :param numpy.ndarray values:  Raw values
+    :return numpy.ndarray:  Normalized values, see `_normalize_pressure`
+    """
+    # an object array, so the marker stays an integer as with the scalar version
+    normalized = (values / 10.0).astype(object)
+    normalized[(values & 0x8000) != 0] = -1
+    return normalized
+
+
+def _normalize_co2_array(values):
+    """
+    Normalize a numpy array of raw CO₂ values
+
+    :param numpy.ndarray values:  Raw values
+    :return numpy.ndarray:  Normalized values, see `_normalize_co2`
+    """
+    return numpy.where(values & 0x8000, -1, values)
+
 
 class Aranet4:
     """
@@ -25,7 +140,8 @@ class Aranet4:
     _cache = {}
     _use_cache = False
     _client = None
-    _last_notification = 0
+    _quiet_timer = None
+    _quiet_event = None
     _reading = False
     _magic = None
 
@@ -45,11 +161,31 @@ class Aranet4:
     UUID_HISTORY_RANGE = "f0cd1402-95da-4f4b-9ac8-aa55d312af0c"
     UUID_HISTORY_NOTIFIER = "f0cd2003-95da-4f4b-9ac8-aa55d312af0c"
 
+    # Characteristics that never change, and can always be cached
+    _IMMUTABLE_UUIDS = {UUID_MANUFACTURER_NAME, UUID_MODEL_NAME, UUID_DEVICE_NAME, UUID_SERIAL_NUMBER,
+                        UUID_HARDWARE_REVISION, UUID_SOFTWARE_REVISION}
+
     # Available sensor identifiers
-    SENSOR_TEMPERATURE = 1
-    SENSOR_HUMIDITY = 2
-    SENSOR_PRESSURE = 3
-    SENSOR_CO2 = 4
+    SENSOR_TEMPERATURE = SENSOR_TEMPERATURE
+    SENSOR_HUMIDITY = SENSOR_HUMIDITY
+    SENSOR_PRESSURE = SENSOR_PRESSURE
+    SENSOR_CO2 = SENSOR_CO2
+
+    # Normalization functions for raw values, per sensor
+    _NORMALIZERS = {
+        SENSOR_TEMPERATURE: _normalize_temperature,
+        SENSOR_HUMIDITY: _normalize_humidity,
+        SENSOR_PRESSURE: _normalize_pressure,
+        SENSOR_CO2: _normalize_co2
+    }
+
+    # Vectorized equivalents of the above, used when numpy is available
+    _ARRAY_NORMALIZERS = {
+        SENSOR_TEMPERATURE: _normalize_temperature_array,
+        SENSOR_HUMIDITY: _normalize_humidity_array,
+        SENSOR_PRESSURE: _normalize_pressure_array,
+        SENSOR_CO2: _normalize_co2_array
+    }
 
     def __init__(self, mac_address=None, use_cache=False, magic_string="Aranet4"):
         """
@@ -66,8 +202,21 @@ class Aranet4:
         `mac_address` is provided, this parameter is ignored.
         """
         logging.debug("Initializing Aranet4 object")
-        self.loop = asyncio.get_event_loop()
+        try:
+            self.loop = asyncio.get_event_loop()
+        except RuntimeError:
+            # newer versions of asyncio and uvloop no longer create a loop
+            # implicitly when there is none yet
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+
+        if hasattr(asyncio, "eager_task_factory"):
+            # Python 3.12+: run tasks inline until they actually need to wait,
+            # skipping a trip through the scheduler for the many short awaits
+            self.loop.set_task_factory(asyncio.eager_task_factory)
+
         self._use_cache = use_cache
+        self._cache = {}
         self._magic = magic_string
 
         if mac_address:
@@ -82,6 +231,15 @@ class Aranet4:
         """
         return self.loop.run_until_complete(self._discover())
 
+    @property
+    def _connected(self):
+        """
+        Whether a connection to the device has been established
+
+        :return bool:
+        """
+        return self._client is not None and self._client.is_connected
+
     @property
     def battery_level(self):
         """
@@ -195,9 +353,10 @@ class Aranet4:
         """
         The pause between sensor updates
 
-        :return SimpleNamespace:  A namespace with an attribute for each
-        sensor, and two special attributes `sensors` (all included sensors) and
-        `timestamps` (a dictionary with an index -> unix timestamp map)
+        :return AttributeDict:  A dictionary with an item for each sensor, and
+        two special items `sensors` (all included sensors) and `timestamps` (a
+        dictionary with an index -> unix timestamp map). Items can also be
+        accessed as attributes.
         """
         return self.loop.run_until_complete(self._get_history())
 
@@ -211,28 +370,67 @@ class Aranet4:
         constants.
         :param int start:  Index to start reading from (1-indexed).
         :param int end:  Index to stop reading at.
-        :return SimpleNamespace:  A namespace with an attribute for each
-        sensor, and two special attributes `sensors` (all included sensors) and
-        `timestamps` (a dictionary with an index -> unix timestamp map)
+        :return AttributeDict:  A dictionary with an item for each sensor, and
+        two special items `sensors` (all included sensors) and `timestamps` (a
+        dictionary with an index -> unix timestamp map). Items can also be
+        accessed as attributes.
         """
         return self.loop.run_until_complete(self._get_history(sensors, start, end))
 
+    def disconnect(self):
+        """
+        Disconnect from the device
+
+        The connection is re-established automatically when reading from the
+        device again afterwards.
+        """
+        if self._client is not None:
+            self.loop.run_until_complete(self._client.disconnect())
+
+        self._client = None
+
     def read_from_uuid(self, uuid):
         """
         Read a raw value from a Bluetooth attribute by UUID
 
+        Attributes that cannot change, such as the device name, are always
+        cached; other attributes only if caching is enabled.
+
         :param str uuid:  The UUID of the attribute to read
         :return bytearray:  Value
         """
-        if self._use_cache and uuid in self._cache:
+        if uuid in self._cache:
             return self._cache[uuid]
 
         value = self.loop.run_until_complete(self._read_value(uuid))
-        if self._use_cache:
+        if self._use_cache or uuid in self._IMMUTABLE_UUIDS:
             self._cache[uuid] = value
 
         return value
 
+    def read_from_uuids(self, uuids):
+        """
+        Read raw values from multiple Bluetooth attributes by UUID
+
+        All values are read in one go, which is faster than reading them one
+        by one with `read_from_uuid`. If caching is enabled, this can be used
+        to prefetch values that are then read via the object's properties.
+
+        :param tuple uuids:  The UUIDs of the attributes to read
+        :return dict:  Values, with UUIDs as keys
+        """
+        values = {uuid: self._cache[uuid] for uuid in uuids if uuid in self._cache}
+
+        missing = [uuid for uuid in uuids if uuid not in values]
+        if missing:
+            read = self.loop.run_until_complete(self._bulk_read(missing))
+            for uuid, value in read.items():
+                if self._use_cache or uuid in self._IMMUTABLE_UUIDS:
+                    self._cache[uuid] = value
+            values.update(read)
+
+        return values
+
     def _normalize_value(self, value, sensor):
         """
         Normalize raw sensor value
@@ -245,28 +443,10 @@ class Aranet4:
         :return:  Normalized value. `-1` if the value is not an actual sensor
         value, but e.g. a 'Calibrating' status.
         """
-        if sensor == self.SENSOR_HUMIDITY:
-            if (value & 0x80) == 0x80:
-                return -1
-        elif sensor == self.SENSOR_CO2:
-            if (value & 0x8000) == 0x8000:
-                return -1
-        elif sensor == self.SENSOR_PRESSURE:
-            if (value & 0x8000) == 0x8000:
-                return -1
-            else:
-                return value / 10.0
-        elif sensor == self.SENSOR_TEMPERATURE:
-            if value == 0x4000:
-                return -1
-            elif value > 0x8000:
-                return 0
-            else:
-                return value / 20.0
-        else:
+        if sensor not in self._NORMALIZERS:
             raise ValueError()
 
-        return value
+        return self._NORMALIZERS[sensor](value)
 
     def _get_readings(self, simple=False):
         """
@@ -283,10 +463,10 @@ class Aranet4:
 
         data = self.read_from_uuid(uuid)
         values = SimpleNamespace()
-        values.co2 = self._normalize_value(le16(data), self.SENSOR_CO2)
-        values.temperature = self._normalize_value(le16(data, 2), self.SENSOR_TEMPERATURE)
-        values.pressure = self._normalize_value(le16(data, 4), self.SENSOR_PRESSURE)
-        values.humidity = self._normalize_value(data[6], self.SENSOR_HUMIDITY)
+        values.co2 = _normalize_co2(le16(data))
+        values.temperature = _normalize_temperature(le16(data, 2))
+        values.pressure = _normalize_pressure(le16(data, 4))
+        values.humidity = _normalize_humidity(data[6])
         values.battery_level = data[7]
 
         if not simple:
@@ -295,59 +475,101 @@ class Aranet4:
 
         return values
 
-    def _get_history_reader(self, sensor):
+    def _get_history_reader(self, chunks):
         """
         Get a callback to handle device notifications with that can access the
         Aranet4 object.
 
-        :param int sensor:  Sensor to access
+        :param list chunks:  List to collect received chunks in
         :return:
         """
-        self._datapoints = {}
-        self._last_notification = time.time()
-
         def _receive_history(sender: int, data: bytearray):
             """
-            Read chunk of archived readings
+            Store chunk of archived readings
 
-            Chunks have the following format:
-            byte 1    : sensor ID (int)
-            byte 2 - 3: index of first datapoint (long)
-            byte 4    : number of valid datapoints in this chunk (there may be
-                        more in the chunk, which can be discarded)
-            byte 5+   : readings for the sensor, as a long or int depending on
-                        what sensor this is
+            Chunks are only parsed once all of them have been received, see
+            `_parse_history()`.
 
             :param int sender:  Handle of the sender Characteristic
             :param bytearray data:  Data as received
             :return:
             """
-            self._last_notification = time.time()
-
-            if data[0] != sensor:
-                # notifications about a different sensor
-                return
-
-            index = le16(data, 1)
-            num_points = data[3]
-            data = data[4:]
-            step = 1 if sensor == self.SENSOR_HUMIDITY else 2
+            self._arm_quiet_timer()
+            chunks.append(bytes(data))
 
-            cursor = 0
-            buffer = {}
+        return _receive_history
 
-            while len(buffer) < num_points:
-                value = data[cursor:cursor + step]
-                cursor += step
+    def _parse_history(self, sensor, chunks):
+        """
+        Parse chunks of archived readings
+
+        Chunks have the following format:
+        byte 1    : sensor ID (int)
+        byte 2 - 3: index of first datapoint (long)
+        byte 4    : number of valid datapoints in this chunk (there may be
+                    more in the chunk, which can be discarded)
+        byte 5+   : readings for the sensor, as a long or int depending on
+                    what sensor this is
+
+        :param int sensor:  Sensor to parse readings for; chunks about other
+        sensors are ignored
+        :param list chunks:  Chunks as received
+        :return dict:  Normalized readings, with indexes as keys
+        """
+        humidity = sensor == SENSOR_HUMIDITY
+        width = 1 if humidity else 2
+
+        valid_chunks = []
+        for chunk in chunks:
+            if not chunk or chunk[0] != sensor:
+                # notifications may also concern a different sensor
+                continue
+
+            # values are paired with indexes after flattening all chunks, so
+            # a short chunk would shift every value after it to the wrong
+            # index - skip it, but keep the rest
+            if len(chunk) < 4 or len(chunk) < 4 + chunk[3] * width:
+                logging.warning("Skipping history chunk that holds fewer datapoints than it claims to")
+                continue
+
+            valid_chunks.append(chunk)
+
+        chunks = valid_chunks
+        if not chunks:
+            return {}
+
+        starts = [le16(chunk, 1) - 2 for chunk in chunks]
+        sizes = [chunk[3] for chunk in chunks]
+
+        if numpy:
+            # normalize all readings in one go
+            dtype = numpy.uint8 if humidity else "<u2"
+            raw = numpy.concatenate([
+                numpy.frombuffer(chunk, dtype=dtype, count=size, offset=4) for chunk, size in zip(chunks, sizes)
+            ]).astype(numpy.int32)
+            values = self._ARRAY_NORMALIZERS[sensor](raw).tolist()
+        else:
+            raw = []
+            for chunk, size in zip(chunks, sizes):
+                raw.extend(chunk[4:4 + size] if humidity else struct.unpack_from("<%iH" % size, chunk, 4))
+            values = map(self._NORMALIZERS[sensor], raw)
 
-                value = value[0] if sensor == self.SENSOR_HUMIDITY else le16(value)
+        indexes = [index for start, size in zip(starts, sizes) for index in range(start, start + size)]
+        return dict(zip(indexes, values))
 
-                buffer[index - 2] = self._normalize_value(value, sensor)
-                index += 1
+    def _arm_quiet_timer(self):
+        """
+        (Re)start the timer that signals the end of a stream of notifications
 
-            self._datapoints = {**self._datapoints, **buffer}
+        The device does not say when it is done sending history, so it is
+        considered done once no notifications have arrived for a while. 0.5
+        seconds seems to be sufficient, but increase if data seems to be
+        missing.
+        """
+        if self._quiet_timer:
+            self._quiet_timer.cancel()
 
-        return _receive_history
+        self._quiet_timer = self.loop.call_later(0.5, self._quiet_event.set)
 
     async def _get_history(self, sensors=None, start=0x0001, end=0xFFFF):
         """
@@ -358,83 +580,93 @@ class Aranet4:
         value.
         :param int start:  Index to start reading from (1-indexed).
         :param int end:  Index to stop reading at
-        :return SimpleNamespace:  A namespace with an attribute for each
-        sensor, and two special attributes `sensors` (all included sensors) and
-        `timestamps` (a dictionary with an index -> unix timestamp map)
+        :return AttributeDict:  A dictionary with an item for each sensor, and
+        two special items `sensors` (all included sensors) and `timestamps` (a
+        dictionary with an index -> unix timestamp map). Items can also be
+        accessed as attributes.
         """
         if not sensors:
-            sensors = (self.SENSOR_CO2, self.SENSOR_HUMIDITY, self.SENSOR_PRESSURE, self.SENSOR_TEMPERATURE)
+            sensors = (SENSOR_CO2, SENSOR_HUMIDITY, SENSOR_PRESSURE, SENSOR_TEMPERATURE)
 
         if self._reading:
             raise Aranet4BusyException()
 
         self._reading = True
-        if not self._address:
-            await self._discover()
-
-        start = start + 1
-        if start < 1:
-            start = 0x0001
-
-        params = bytearray.fromhex("820000000100ffff")  # magic value?
-        params = write_le16(params, 4, start)
-        params = write_le16(params, 6, end)
-        readings = SimpleNamespace()
-        keys = ["", "temperature", "humidity", "pressure", "co2"]
-        included_keys = []
-        encountered_indexes = []
-        index_map = {}
-
-        interval = le16(await self._client.read_gatt_char(self.UUID_UPDATE_INTERVAL))
-        for sensor in sensors:
-            logging.debug("Retrieving stored values for sensor %s" % str(sensor))
-            params[1] = sensor
-
-            last_timestamp = round(time.time()) - le16(
-                await self._client.read_gatt_char(self.UUID_SINCE_LAST_UPDATE))
-
-            await self._client.write_gatt_char(self.UUID_HISTORY_RANGE, params)
-
-            logging.debug("Asking for history")
-            await self._client.start_notify(self.UUID_HISTORY_NOTIFIER, self._get_history_reader(sensor))
-            while self._last_notification and time.time() - self._last_notification < 0.5:
-                # 0.5 seconds seems to be sufficient, but increase if data
-                # seems to be missing
-                await asyncio.sleep(0.1)
-
-            logging.debug("Received %i stored values" % len(self._datapoints))
-            await self._client.stop_notify(self.UUID_HISTORY_NOTIFIER)
+        try:
+            if not self._connected:
+                await self._discover()
+
+            start = start + 1
+            if start < 1:
+                start = 0x0001
+
+            params = bytearray.fromhex("820000000100ffff")  # magic value?
+            params = write_le16(params, 4, start)
+            params = write_le16(params, 6, end)
+            readings = AttributeDict()
+            keys = ["", "temperature", "humidity", "pressure", "co2"]
+            included_keys = []
+            common_indexes = None
+            index_map = {}
+
+            interval = le16(await self._client.read_gatt_char(self.UUID_UPDATE_INTERVAL))
+            for sensor in sensors:
+                logging.debug("Retrieving stored values for sensor %s" % str(sensor))
+                params[1] = sensor
+
+                last_timestamp = round(time.time()) - le16(
+                    await self._client.read_gatt_char(self.UUID_SINCE_LAST_UPDATE))
+
+                await self._client.write_gatt_char(self.UUID_HISTORY_RANGE, params)
+
+                logging.debug("Asking for history")
+                self._quiet_event = asyncio.Event()
+                chunks = []
+                self._arm_quiet_timer()
+                await self._client.start_notify(self.UUID_HISTORY_NOTIFIER, self._get_history_reader(chunks))
+                await self._quiet_event.wait()
+
+                await self._client.stop_notify(self.UUID_HISTORY_NOTIFIER)
+                # a notification may have re-armed the timer before notifications
+                # were stopped
+                self._quiet_timer.cancel()
+                self._quiet_timer = None
+                datapoints = self._parse_history(sensor, chunks)
+                logging.debug("Received %i stored values" % len(datapoints))
+                if common_indexes is None:
+                    common_indexes = set(datapoints)
+                else:
+                    common_indexes &= datapoints.keys()
+                index_map[max(datapoints)] = last_timestamp
+
+                # store
+                readings[keys[sensor]] = datapoints
+                included_keys.append(keys[sensor])
+        finally:
             self._reading = False
-            encountered_indexes.append(set(self._datapoints.keys()))
-            index_map[max(self._datapoints)] = last_timestamp
-
-            # store
-            readings.__setattr__(keys[sensor], self._datapoints)
-            included_keys.append(keys[sensor])
+            if self._quiet_timer:
+                self._quiet_timer.cancel()
+                self._quiet_timer = None
 
         # normalize keys, in case not all sensors returned the same points
         # this can happen if the sensors update between reading different
         # sensors. In that case we discard the indexes that do not occur for
         # all sensors
-        common_indexes = set.intersection(*encountered_indexes)
         for sensor in included_keys:
-            sensor_data = readings.__getattribute__(sensor).copy()
-            for key in sensor_data:
-                if key not in common_indexes:
-                    logging.debug("Discarding one uncommon datapoint from sensor %s" % str(sensor))
-                    del readings.__getattribute__(sensor)[key]
+            sensor_data = readings[sensor]
+            if len(sensor_data) != len(common_indexes):
+                logging.debug("Discarding %i uncommon datapoints from sensor %s" % (
+                    len(sensor_data) - len(common_indexes), str(sensor)))
+                readings[sensor] = {k: v for k, v in sensor_data.items() if k in common_indexes}
 
         # now convert indexes to timestamps
         common_indexes = sorted(common_indexes, reverse=True)
-        timestamp = index_map[common_indexes[0]]
-        readings.timestamps = {}
-        for index in common_indexes:
-            readings.timestamps[index] = timestamp
-            timestamp -= interval
+        latest = index_map[common_indexes[0]]
+        readings["timestamps"] = dict(zip(common_indexes, (latest - i * interval for i in range(len(common_indexes)))))
 
         logging.debug(
-            "Oldest timestamp: %s" % datetime.datetime.fromtimestamp(min(readings.timestamps.values())).strftime("%c"))
-        readings.sensors = included_keys
+            "Oldest timestamp: %s" % datetime.datetime.fromtimestamp(min(readings["timestamps"].values())).strftime("%c"))
+        readings["sensors"] = included_keys
         return readings
 
     async def _discover(self):
@@ -445,6 +677,9 @@ class Aranet4:
         :raises Aranet4NotFoundException:  If no device that looks like an
         Aranet4 can be found.
         """
+        if self._connected:
+            return self._address
+
         if not self._address:
             logging.debug("No MAC address known, starting discovery")
             devices = await BleakScanner.discover()
@@ -470,7 +705,7 @@ class Aranet4:
         :param uuid:  UUID of attribute to read from
         :return bytearray:  Returned value
         """
-        if not self._address:
+        if not self._connected:
             await self._discover()
 
         try:
@@ -479,3 +714,23 @@ class Aranet4:
             raise Aranet4UnpairedException("Error reading from device. Check if it is properly paired.")
 
         return value
+
+    async def _bulk_read(self, uuids):
+        """
+        Read multiple GATT values from device
+
+        The reads are independent, so they are issued concurrently rather than
+        waiting for each round trip to the device to complete in turn.
+
+        :param list uuids:  UUIDs of attributes to read from
+        :return dict:  Returned values, with UUIDs as keys
+        """
+        if not self._connected:
+            await self._discover()
+
+        try:
+            values = await asyncio.gather(*[self._client.read_gatt_char(uuid) for uuid in uuids])
+        except BleakError as e:
+            raise Aranet4UnpairedException("Error reading from device. Check if it is properly paired.")
+
+        return dict(zip(uuids, values))
@@ -1,6 +1,9 @@
 """
 Utility functions for pyaranet4
 """
+import struct
+
+_LE16 = struct.Struct("<H")
 
 
 def le16(data, start=0):
@@ -11,8 +14,7 @@ def le16(data, start=0):
     :param int start:  Offset to start reading at
     :return int:  An integer, read from the first two bytes at the offset.
     """
-    raw = bytearray(data)
-    return raw[start] + (raw[start + 1] << 8)
+    return _LE16.unpack_from(data, start)[0]
 
 
 def write_le16(data, pos, value):
@@ -24,7 +26,22 @@ def write_le16(data, pos, value):
     :param int value:  Value to store
     :return bytearray:  Updated bytearray
     """
-    data[pos] = (value) & 0x00FF
-    data[pos + 1] = (value >> 8) & 0x00FF
+    _LE16.pack_into(data, pos, value & 0xFFFF)
 
     return data
+
+
+class AttributeDict(dict):
+    """
+    Dictionary of which the items can also be accessed as attributes
+
+    `readings["co2"]` and `readings.co2` are equivalent; the former is faster.
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value